@@ -8,6 +8,10 @@ from services.sound_effects import get_sound_effects_from_config
 
 
 class AudioPlayer:
+    def __init__(self):
+        # the beep sample resampled to the sample rates we've seen so far
+        self.beep_audio_cache: dict[int, np.ndarray] = {}
+
     def play_file(self, filename: str):
         with open(filename, "rb") as f:
             audio_data = f.read()
@@ -56,6 +60,19 @@ class AudioPlayer:
         return audio, sample_rate
 
     def _add_beep_effect(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        beep_audio = self._get_beep_audio(sample_rate)
+
+        # Concatenate the beep sound to the start and end of the audio
+        audio_with_beeps = np.concatenate((beep_audio, audio, beep_audio), axis=0)
+
+        return audio_with_beeps
+
+    def _get_beep_audio(self, sample_rate: int) -> np.ndarray:
+        # reading and resampling the beep is done before playback starts, so only do it once per sample rate
+        beep_audio = self.beep_audio_cache.get(sample_rate)
+        if beep_audio is not None:
+            return beep_audio
+
         bundle_dir = path.abspath(path.dirname(__file__))
         beep_audio, beep_sample_rate = self.get_audio_from_file(
             path.join(bundle_dir, "../audio_samples/beep.wav")
@@ -65,10 +82,8 @@ class AudioPlayer:
         if beep_sample_rate != sample_rate:
             beep_audio = self._resample_audio(beep_audio, beep_sample_rate, sample_rate)
 
-        # Concatenate the beep sound to the start and end of the audio
-        audio_with_beeps = np.concatenate((beep_audio, audio, beep_audio), axis=0)
-
-        return audio_with_beeps
+        self.beep_audio_cache[sample_rate] = beep_audio
+        return beep_audio
 
     def _resample_audio(
         self, audio: np.ndarray, original_sample_rate: int, target_sample_rate: int
@@ -19,6 +19,7 @@ class EdgeTTS(FileCreator):
         super().__init__(app_root_dir, RECORDING_PATH)
 
         self.random_voices = {}
+        self.voices_manager: VoicesManager = None
 
     async def generate_speech(
         self,
@@ -38,8 +39,10 @@ class EdgeTTS(FileCreator):
     async def get_random_voice(
         self, gender: str = "Male", locale: str = "en-US"
     ) -> str:
-        voices = await VoicesManager.create()
-        voice = voices.find(Gender=gender, Locale=locale)
+        # fetching the voice list is a network call, so only do it once
+        if not self.voices_manager:
+            self.voices_manager = await VoicesManager.create()
+        voice = self.voices_manager.find(Gender=gender, Locale=locale)
         random_voice = random.choice(voice)
         return random_voice.get("ShortName")
 
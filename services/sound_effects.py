@@ -82,19 +82,11 @@ def get_sound_effects_from_config(config: dict):
 
     sound_effects = []
 
-    mapping = {
-        "ROBOT": SoundEffects.ROBOT.value,
-        "RADIO": SoundEffects.RADIO.value,
-        "INTERIOR_HELMET": SoundEffects.INTERIOR_HELMET.value,
-        "INTERIOR_SMALL": SoundEffects.INTERIOR_SMALL.value,
-        "INTERIOR_MEDIUM": SoundEffects.INTERIOR_MEDIUM.value,
-        "INTERIOR_LARGE": SoundEffects.INTERIOR_LARGE.value,
-    }
-
     for effect_name in sound_effects_config:
-        effect = mapping.get(effect_name)
-        if effect:
-            sound_effects.append(effect)
+        # the enum already maps the names to its members, so there's no need to build our own mapping on every call
+        effect = SoundEffects.__members__.get(effect_name)
+        if effect is not None:
+            sound_effects.append(effect.value)
         else:
             print(f"Unknown sound effect: {effect_name}")
 
@@ -1,15 +1,7 @@
+import asyncio
 import json
+import textwrap
 from typing import Mapping
-import azure.cognitiveservices.speech as speechsdk
-from elevenlabslib import (
-    ElevenLabsUser,
-    GenerationOptions,
-    PlaybackOptions,
-    ElevenLabsVoice,
-    ElevenLabsDesignedVoice,
-    ElevenLabsClonedVoice,
-    ElevenLabsProfessionalVoice,
-)
 from services.open_ai import AzureConfig, OpenAi
 from services.edge import EdgeTTS
 from services.printr import Printr
@@ -25,6 +17,29 @@ class OpenAiWingman(Wingman):
     It transcribes speech to text using Whisper, uses the Completion API for conversation and implements the Tools API to execute functions.
     """
 
+    LOCALE_PROMPT = textwrap.dedent("""\
+        I'll say a natural language name in lowercase and you'll just return the IETF country code / locale for this language.
+        Your answer always has exactly 2 lowercase letters, a dash, then two more letters in uppercase.
+        If I say "german", you answer with "de-DE". If I say "russian", you answer with "ru-RU".
+        If it's ambiguous and you don't know which locale to pick ("en-GB" vs "en-US"), you pick the most commonly used one.
+        You only answer with valid country codes according to most common standards.
+        If you can't, you respond with "None".
+        """)
+    """The system prompt used to map the language name returned by Whisper to a locale. See __ask_gpt_for_locale()."""
+
+    CONDENSE_PROMPT = textwrap.dedent("""\
+        Summarize the following conversation between a user and an assistant as briefly as possible.
+        Preserve all names, places, numbers, prices and decisions that could be referred to later.
+        Only respond with the summary.
+        """)
+    """The system prompt used to condense messages removed from the conversation history. See _condense_messages()."""
+
+    CONDENSE_BATCH_SIZE = 5
+    """How many user messages have to be over the remember_messages limit before they are condensed (and removed) at once. Condensing every single message that drops out would cost a GPT call on every turn."""
+
+    TOOL_RESULT_STUB = "(result omitted)"
+    """Replaces the content of function responses from previous turns. See _compact_tool_messages()."""
+
     def __init__(
         self,
         name: str,
@@ -51,6 +66,7 @@ class OpenAiWingman(Wingman):
         self.edge_tts = EdgeTTS(app_root_dir)
         self.last_transcript_locale = None
         self.elevenlabs_api_key = None
+        self.elevenlabs_voice = None
         self.azure_keys = {
             "tts": None,
             "whisper": None,
@@ -65,6 +81,22 @@ class OpenAiWingman(Wingman):
             "summarize_provider", None
         )
 
+        self.command_names = [
+            command["name"]
+            for command in self.config.get("commands", [])
+            if not command.get("instant_activation")
+        ]
+        """The names of all commands that are not instant_activation. These are the values GPT can pick from when calling 'execute_command'."""
+
+        self.function_handlers = {"execute_command": self._execute_command_function}
+        """Maps the names of the functions GPT can call to their (async) handlers. Custom wingmen can register their own functions here."""
+
+        self.concurrent_functions: set[str] = set()
+        """The names of the functions in function_handlers that don't have side effects and can run concurrently if GPT calls multiple functions at once."""
+
+        self.tools: list[dict] = None
+        """The tool descriptors sent with every GPT call. Built once in prepare() (and rebuilt on the next call if reset to None) so that the request prefix (context + tools) stays identical across turns and can be served from OpenAI's prompt cache."""
+
     def validate(self):
         errors = super().validate()
         openai_api_key = self.secret_keeper.retrieve(
@@ -88,6 +120,11 @@ class OpenAiWingman(Wingman):
 
         return errors
 
+    def prepare(self):
+        super().prepare()
+        # build the tools up front so that the first GPT call doesn't have to
+        self.tools = self._build_tools()
+
     def __validate_elevenlabs_config(self, errors):
         if self.tts_provider == "elevenlabs":
             self.elevenlabs_api_key = self.secret_keeper.retrieve(
@@ -135,55 +172,25 @@ class OpenAiWingman(Wingman):
                 )
                 return
 
-        if self.tts_provider == "azure":
-            self.azure_keys["tts"] = self.secret_keeper.retrieve(
-                requester=self.name,
-                key="azure_tts",
-                friendly_key_name="Azure TTS API key",
-                prompt_if_missing=True,
-            )
-            if not self.azure_keys["tts"]:
-                errors.append(
-                    "Missing 'azure' tts API key. Please provide a valid key in the settings."
-                )
-                return
-
-        if self.stt_provider == "azure":
-            self.azure_keys["whisper"] = self.secret_keeper.retrieve(
-                requester=self.name,
-                key="azure_whisper",
-                friendly_key_name="Azure Whisper API key",
-                prompt_if_missing=True,
-            )
-            if not self.azure_keys["whisper"]:
-                errors.append(
-                    "Missing 'azure' whisper API key. Please provide a valid key in the settings."
-                )
-                return
-
-        if self.conversation_provider == "azure":
-            self.azure_keys["conversation"] = self.secret_keeper.retrieve(
-                requester=self.name,
-                key="azure_conversation",
-                friendly_key_name="Azure Conversation API key",
-                prompt_if_missing=True,
-            )
-            if not self.azure_keys["conversation"]:
-                errors.append(
-                    "Missing 'azure' conversation API key. Please provide a valid key in the settings."
-                )
-                return
+        azure_sections = [
+            ("tts", self.tts_provider, "TTS"),
+            ("whisper", self.stt_provider, "Whisper"),
+            ("conversation", self.conversation_provider, "Conversation"),
+            ("summarize", self.summarize_provider, "Summarize"),
+        ]
+        for section, provider, friendly_name in azure_sections:
+            if provider != "azure":
+                continue
 
-        if self.summarize_provider == "azure":
-            self.azure_keys["summarize"] = self.secret_keeper.retrieve(
+            self.azure_keys[section] = self.secret_keeper.retrieve(
                 requester=self.name,
-                key="azure_summarize",
-                friendly_key_name="Azure Summarize API key",
+                key=f"azure_{section}",
+                friendly_key_name=f"Azure {friendly_name} API key",
                 prompt_if_missing=True,
             )
-            if not self.azure_keys["summarize"]:
+            if not self.azure_keys[section]:
                 errors.append(
-                    "Missing 'azure' summarize API key. Please provide a valid key in the settings."
+                    f"Missing 'azure' {section} API key. Please provide a valid key in the settings."
                 )
                 return
 
@@ -228,15 +235,12 @@ class OpenAiWingman(Wingman):
 
     def _get_azure_config(self, section: str):
         azure_api_key = self.azure_keys[section]
+        section_config = self.config["azure"].get(section, {})
         azure_config = AzureConfig(
             api_key=azure_api_key,
-            api_base_url=self.config["azure"]
-            .get(section, {})
-            .get("api_base_url", None),
-            api_version=self.config["azure"].get(section, {}).get("api_version", None),
-            deployment_name=self.config["azure"]
-            .get(section, {})
-            .get("deployment_name", None),
+            api_base_url=section_config.get("api_base_url", None),
+            api_version=section_config.get("api_version", None),
+            deployment_name=section_config.get("deployment_name", None),
         )
 
         return azure_config
@@ -262,6 +266,9 @@ class OpenAiWingman(Wingman):
         if instant_response:
             return instant_response, instant_response
 
+        # we're calling GPT anyway, so now we can afford to condense the history (if enabled and needed)
+        self._cleanup_conversation_history(includes_new_user_message=True)
+
         completion = self._gpt_call()
 
         if completion is None:
@@ -292,11 +299,34 @@ class OpenAiWingman(Wingman):
             name (Optional[str]): The name of the function associated with the tool call, if applicable.
         """
         msg = {"role": "user", "content": content}
-        self._cleanup_conversation_history()
+        # condensing calls GPT, so it's deferred until we know that this isn't an instant activation command
+        self._cleanup_conversation_history(condense=False)
+        self._compact_tool_messages()
         self.messages.append(msg)
 
-    def _cleanup_conversation_history(self):
-        """Cleans up the conversation history by removing messages that are too old."""
+    def _compact_tool_messages(self):
+        """Replaces the content of tool messages from previous turns with a short stub.
+
+        Function responses (like API results) can be large and would otherwise be re-sent with every GPT call.
+        The assistant already answered based on them, so that answer is what we keep in the conversation.
+        """
+        for message in self.messages:
+            if (
+                isinstance(message, Mapping)
+                and message.get("role") == "tool"
+                and len(message.get("content") or "") > len(self.TOOL_RESULT_STUB)
+            ):
+                message["content"] = self.TOOL_RESULT_STUB
+
+    def _cleanup_conversation_history(
+        self, condense: bool = True, includes_new_user_message: bool = False
+    ):
+        """Cleans up the conversation history by removing messages that are too old.
+
+        Args:
+            condense (bool): If condense_history is enabled, whether the removed messages may be condensed (which calls GPT) now. If not, they are kept until a later call.
+            includes_new_user_message (bool): Whether the message of the current turn was already added. It doesn't count towards remember_messages then.
+        """
         remember_messages = self.config.get("features", {}).get(
             "remember_messages", None
         )
@@ -304,6 +334,9 @@ class OpenAiWingman(Wingman):
         if remember_messages is None or len(self.messages) == 0:
             return 0  # Configuration not set, nothing to delete.
 
+        if includes_new_user_message:
+            remember_messages += 1
+
         # The system message aka `context` does not count
         context_offset = (
             1 if self.messages and self.messages[0]["role"] == "system" else 0
@@ -325,9 +358,33 @@ class OpenAiWingman(Wingman):
 
         total_deleted_messages = cutoff_index - context_offset  # Messages to delete.
 
+        # Optionally keep a summary of the messages we're about to delete (including an older summary).
+        summary_message = None
+        if total_deleted_messages > 0 and self.config.get("features", {}).get(
+            "condense_history", False
+        ):
+            if not condense:
+                return 0
+
+            deleted_user_messages = sum(
+                1
+                for message in self.messages[context_offset:cutoff_index]
+                if self.__get_message_role(message) == "user"
+            )
+            # wait until there's a whole batch to condense instead of calling GPT for every message that drops out
+            if deleted_user_messages < self.CONDENSE_BATCH_SIZE:
+                return 0
+
+            summary_message = self._condense_messages(
+                self.messages[context_offset:cutoff_index]
+            )
+
         # Remove the messages before the cutoff index, exclusive of the system message.
         del self.messages[context_offset:cutoff_index]
 
+        if summary_message:
+            self.messages.insert(context_offset, summary_message)
+
         # Optional debugging printout.
         if self.debug and total_deleted_messages > 0:
             printr.print(
@@ -337,6 +394,49 @@ class OpenAiWingman(Wingman):
 
         return total_deleted_messages
 
+    def _condense_messages(self, messages: list) -> dict | None:
+        """Summarizes messages that are removed from the conversation history so that their gist is not lost.
+
+        Args:
+            messages (list): The messages that will be removed from the history.
+
+        Returns:
+            dict | None: A system message containing the summary or None if there was nothing to summarize or the GPT call failed.
+        """
+        transcript = "\n".join(
+            f"{self.__get_message_role(message)}: {content}"
+            for message in messages
+            if (content := self.__get_message_content(message))
+        )
+        if not transcript:
+            return None
+
+        azure_config = None
+        if self.summarize_provider == "azure":
+            azure_config = self._get_azure_config("summarize")
+
+        response = self.openai.ask(
+            messages=[
+                {"content": self.CONDENSE_PROMPT, "role": "system"},
+                {"content": transcript, "role": "user"},
+            ],
+            model=self.config["openai"].get("summarize_model"),
+            azure_config=azure_config,
+        )
+        if response is None or not response.choices[0].message.content:
+            return None
+
+        if self.debug:
+            printr.print(
+                f"Condensed {len(messages)} messages of the conversation history.",
+                tags="info",
+            )
+
+        return {
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {response.choices[0].message.content}",
+        }
+
     def reset_conversation_history(self):
         """Resets the conversation history by removing all messages except for the initial system message."""
         del self.messages[1:]
@@ -372,9 +472,12 @@ class OpenAiWingman(Wingman):
         if self.conversation_provider == "azure":
             azure_config = self._get_azure_config("conversation")
 
+        if self.tools is None:
+            self.tools = self._build_tools()
+
         return self.openai.ask(
             messages=self.messages,
-            tools=self._build_tools(),
+            tools=self.tools,
             model=self.config["openai"].get("conversation_model"),
             azure_config=azure_config,
         )
@@ -406,17 +509,41 @@ class OpenAiWingman(Wingman):
             str: The immediate response from processed tool calls or None if there are no immediate responses.
         """
         instant_response = None
-        function_response = ""
+        function_calls = [
+            (tool_call.function.name, json.loads(tool_call.function.arguments))
+            for tool_call in tool_calls
+        ]
 
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            (
-                function_response,
-                instant_response,
-            ) = await self._execute_command_by_function_call(
-                function_name, function_args
+        # Functions that are safe to run concurrently (e.g. API requests) are started right away.
+        # Everything else (like commands that press keys and play audio) runs one after another in the requested order.
+        concurrent_indices = [
+            index
+            for index, (function_name, _) in enumerate(function_calls)
+            if function_name in self.concurrent_functions
+        ]
+        concurrent_index_set = set(concurrent_indices)
+        concurrent_calls = asyncio.gather(
+            *(
+                self._execute_command_by_function_call(*function_calls[index])
+                for index in concurrent_indices
             )
+        )
+
+        results = {}
+        try:
+            for index, (function_name, function_args) in enumerate(function_calls):
+                if index not in concurrent_index_set:
+                    results[index] = await self._execute_command_by_function_call(
+                        function_name, function_args
+                    )
+        finally:
+            # always wait for the concurrent calls so that they don't keep running (and fail) unobserved if a sequential one raised
+            concurrent_results = await concurrent_calls
+        results.update(zip(concurrent_indices, concurrent_results))
+
+        for index, tool_call in enumerate(tool_calls):
+            function_name = tool_call.function.name
+            function_response, instant_response = results[index]
 
             msg = {"role": "tool", "content": function_response}
             if tool_call.id is not None:
@@ -471,7 +598,7 @@ class OpenAiWingman(Wingman):
         self, function_name: str, function_args: dict[str, any]
     ) -> tuple[str, str]:
         """
-        Uses an OpenAI function call to execute a command. If it's an instant activation_command, one if its reponses will be played.
+        Executes an OpenAI function call using the handler registered for it in function_handlers. Unknown functions are ignored.
 
         Args:
             function_name (str): The name of the function to be executed.
@@ -482,16 +609,33 @@ class OpenAiWingman(Wingman):
             - function_response (str): The text response or result obtained after executing the function.
             - instant_response (str): An immediate response or action to be taken, if any (e.g., play audio).
         """
+        handler = self.function_handlers.get(function_name)
+        if handler is None:
+            return "", ""
+
+        return await handler(function_args)
+
+    async def _execute_command_function(
+        self, function_args: dict[str, any]
+    ) -> tuple[str, str]:
+        """Handles the 'execute_command' function: executes the command and plays one of its responses (if any).
+
+        Args:
+            function_args (dict[str, any]): The arguments GPT passed to the function.
+
+        Returns:
+            A tuple containing the function response and the instant response.
+        """
         function_response = ""
         instant_reponse = ""
-        if function_name == "execute_command":
-            # get the command based on the argument passed by GPT
-            command = self._get_command(function_args["command_name"])
-            # execute the command
-            function_response = self._execute_command(command)
-            # if the command has responses, we have to play one of them
-            if command and command.get("responses"):
-                instant_reponse = self._select_command_response(command)
+        # get the command based on the argument passed by GPT
+        command = self._get_command(function_args["command_name"])
+        # execute the command
+        function_response = self._execute_command(command)
+        # if the command has responses, we have to play one of them
+        if command:
+            instant_reponse = self._select_command_response(command) or ""
+            if instant_reponse:
                 await self._play_to_user(instant_reponse)
 
         return function_response, instant_reponse
@@ -519,6 +663,9 @@ class OpenAiWingman(Wingman):
             self.audio_player.stream_with_effects(response.content, self.config)
 
     def _play_with_azure(self, text):
+        # imported lazily: the Speech SDK is big and only needed if Azure TTS is configured
+        import azure.cognitiveservices.speech as speechsdk
+
         azure_config = self.config["azure"].get("tts", None)
 
         if azure_config is None:
@@ -530,17 +677,16 @@ class OpenAiWingman(Wingman):
         )
         speech_config.speech_synthesis_voice_name = azure_config["voice"]
 
-        if azure_config["detect_language"]:
-            auto_detect_source_language_config = (
-                speechsdk.AutoDetectSourceLanguageConfig()
-            )
+        auto_detect_source_language_config = (
+            speechsdk.AutoDetectSourceLanguageConfig()
+            if azure_config["detect_language"]
+            else None
+        )
 
         speech_synthesizer = speechsdk.SpeechSynthesizer(
             speech_config=speech_config,
             audio_config=None,
-            auto_detect_source_language_config=auto_detect_source_language_config
-            if azure_config["detect_language"]
-            else None,
+            auto_detect_source_language_config=auto_detect_source_language_config,
         )
 
         result = speech_synthesizer.speak_text_async(text).get()
@@ -566,33 +712,22 @@ class OpenAiWingman(Wingman):
         self.audio_player.stream_with_effects((audio, sample_rate), self.config)
 
     def _play_with_elevenlabs(self, text: str):
+        # imported lazily: elevenlabslib is only needed if Elevenlabs is configured
+        from elevenlabslib import GenerationOptions, PlaybackOptions
+
         # presence already validated in validate()
         elevenlabs_config = self.config["elevenlabs"]
-        # validate() already checked that either id or name is set
-        voice_id = elevenlabs_config["voice"].get("id")
-        voice_name = elevenlabs_config["voice"].get("name")
-
         voice_settings = elevenlabs_config.get("voice_settings", {})
-        user = ElevenLabsUser(self.elevenlabs_api_key)
         model = elevenlabs_config.get("model", "eleven_multilingual_v2")
-
-        voice: (
-            ElevenLabsVoice
-            | ElevenLabsDesignedVoice
-            | ElevenLabsClonedVoice
-            | ElevenLabsProfessionalVoice
-        ) = None
-        if voice_id:
-            voice = user.get_voice_by_ID(voice_id)
-        else:
-            voice = user.get_voices_by_name(voice_name)[0]
+        voice = self._get_elevenlabs_voice()
 
         # todo: add start/end callbacks to play Quindar beep even if use_sound_effects is disabled
         playback_options = PlaybackOptions(runInBackground=True)
+        style = voice_settings.get("style")
         generation_options = GenerationOptions(
             model=model,
             latencyOptimizationLevel=elevenlabs_config.get("latency", 0),
-            style=voice_settings.get("style", 0),
+            style=style if style is not None else 0,
             use_speaker_boost=voice_settings.get("use_speaker_boost", True),
         )
         stability = voice_settings.get("stability")
@@ -603,7 +738,6 @@ class OpenAiWingman(Wingman):
         if similarity_boost is not None:
             generation_options.similarity_boost = similarity_boost
 
-        style = voice_settings.get("style")
         if style is not None and model != "eleven_turbo_v2":
             generation_options.style = style
 
@@ -622,6 +756,28 @@ class OpenAiWingman(Wingman):
                 generationOptions=generation_options,
             )
 
+    def _get_elevenlabs_voice(self):
+        """Returns the configured Elevenlabs voice (ElevenLabsVoice, ElevenLabsDesignedVoice, ElevenLabsClonedVoice or ElevenLabsProfessionalVoice).
+        Resolving it requires API calls, so it's only done once.
+        """
+        if self.elevenlabs_voice:
+            return self.elevenlabs_voice
+
+        from elevenlabslib import ElevenLabsUser
+
+        # validate() already checked that either id or name is set
+        voice_config = self.config["elevenlabs"]["voice"]
+        voice_id = voice_config.get("id")
+        voice_name = voice_config.get("name")
+
+        user = ElevenLabsUser(self.elevenlabs_api_key)
+        if voice_id:
+            self.elevenlabs_voice = user.get_voice_by_ID(voice_id)
+        else:
+            self.elevenlabs_voice = user.get_voices_by_name(voice_name)[0]
+
+        return self.elevenlabs_voice
+
     def _execute_command(self, command: dict) -> str:
         """Does what Wingman base does, but always returns "Ok" instead of a command response.
         Otherwise the AI will try to respond to the command and generate a "duplicate" response for instant_activation commands.
@@ -633,14 +789,16 @@ class OpenAiWingman(Wingman):
         """
         Builds a tool for each command that is not instant_activation.
 
+        The result is cached in self.tools for the lifetime of the Wingman (it's built in prepare()).
+        If you override this and build tools from state that changes at runtime, set self.tools to None whenever it does so that the next GPT call rebuilds them.
+
         Returns:
             list[dict]: A list of tool descriptors in OpenAI format.
         """
-        commands = [
-            command["name"]
-            for command in self.config.get("commands", [])
-            if not command.get("instant_activation")
-        ]
+        # an empty enum is an invalid schema and GPT couldn't call the function anyway
+        if not self.command_names:
+            return []
+
         tools = [
             {
                 "type": "function",
@@ -653,7 +811,7 @@ class OpenAiWingman(Wingman):
                             "command_name": {
                                 "type": "string",
                                 "description": "The command to execute",
-                                "enum": commands,
+                                "enum": self.command_names,
                             },
                         },
                         "required": ["command_name"],
@@ -674,14 +832,7 @@ class OpenAiWingman(Wingman):
         response = self.openai.ask(
             messages=[
                 {
-                    "content": """
-                        I'll say a natural language name in lowercase and you'll just return the IETF country code / locale for this language.
-                        Your answer always has exactly 2 lowercase letters, a dash, then two more letters in uppercase.
-                        If I say "german", you answer with "de-DE". If I say "russian", you answer with "ru-RU".
-                        If it's ambiguous and you don't know which locale to pick ("en-GB" vs "en-US"), you pick the most commonly used one.
-                        You only answer with valid country codes according to most common standards.
-                        If you can't, you respond with "None".
-                    """,
+                    "content": self.LOCALE_PROMPT,
                     "role": "system",
                 },
                 {
@@ -701,6 +852,12 @@ class OpenAiWingman(Wingman):
         )
         return answer
 
+    def __get_message_content(self, message):
+        """Helper method to get the content of the message regardless of its type."""
+        if isinstance(message, Mapping):
+            return message.get("content")
+        return getattr(message, "content", None)
+
     def __get_message_role(self, message):
         """Helper method to get the role of the message regardless of its type."""
         if isinstance(message, Mapping):
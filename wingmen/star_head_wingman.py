@@ -1,6 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+import asyncio
 import json
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from services.printr import Printr
 from services.secret_keeper import SecretKeeper
 from wingmen.open_ai_wingman import OpenAiWingman
@@ -37,12 +42,44 @@ class StarHeadWingman(OpenAiWingman):
         self.timeout = 5
         """Global timeout for calls to the the StarHead API (in seconds)"""
 
+        self.adapter = HTTPAdapter()
+        """Keeps the connections to the StarHead API alive between requests. Its connection pool is thread-safe, so all sessions share it."""
+
+        self.thread_local = threading.local()
+        """Holds one requests.Session per thread (see _get_session()) as sessions aren't documented to be thread-safe."""
+
+        self.route_cache_ttl = 300
+        """How long a trading route is reused for the same ship, position and budget (in seconds). Prices don't change that quickly."""
+
+        self.route_cache: dict[tuple[str, str, float], tuple[float, str]] = {}
+        """(ship, position, money) -> (timestamp, trading route)"""
+
+        self.ship_loadouts: dict[int, dict[str, any]] = {}
+        """Ship ID -> loadout data. Loadouts are static, so they're only fetched once per ship."""
+
+        self.cache_lock = threading.Lock()
+        """Guards route_cache and ship_loadouts. Trading routes are calculated in worker threads and GPT can request several at once."""
+
         self.vehicles = []
         self.ship_names = []
         self.celestial_objects = []
         self.celestial_object_names = []
         self.quantum_drives = []
 
+        self.vehicles_by_name: dict[str, dict[str, any]] = {}
+        """Lowercased formatted ship name -> vehicle. Used to resolve the ship names GPT passes to us."""
+
+        self.celestial_object_ids: dict[str, int] = {}
+        """Lowercased celestial object name -> celestial object ID."""
+
+        self.trading_route_tool: dict[str, any] = None
+        """The 'get_best_trading_route' tool descriptor. Built once whenever the StarHead data is (re-)loaded."""
+
+        self.function_handlers["get_best_trading_route"] = (
+            self._get_best_trading_route_function
+        )
+        self.concurrent_functions.add("get_best_trading_route")
+
     def validate(self):
         # collect errors from the base class (if any)
         errors: list[str] = super().validate()
@@ -64,19 +101,53 @@ class StarHeadWingman(OpenAiWingman):
 
         self.start_execution_benchmark()
 
-        self.vehicles = self._fetch_data("vehicle")
-        self.ship_names = [
-            self._format_ship_name(vehicle)
-            for vehicle in self.vehicles
-            if vehicle["type"] == "Ship"
-        ]
+        # everything we cached was derived from the old data
+        with self.cache_lock:
+            self.route_cache.clear()
+            self.ship_loadouts.clear()
+
+        # the endpoints don't depend on each other, so fetch them all at once instead of waiting for each in turn
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            vehicles = executor.submit(self._fetch_data, "vehicle")
+            celestial_objects = executor.submit(self._fetch_data, "celestialobject")
+            quantum_drives = executor.submit(
+                self._fetch_data, "vehiclecomponent", {"typeFilter": 8}
+            )
+            self.vehicles = vehicles.result()
+            self.celestial_objects = celestial_objects.result()
+            self.quantum_drives = quantum_drives.result()
+        if self.debug:
+            # the requests overlap, so only the time for all of them together is meaningful
+            self.print_execution_time(reset_timer=True)
 
-        self.celestial_objects = self._fetch_data("celestialobject")
-        self.celestial_object_names = [
-            celestial_object["name"] for celestial_object in self.celestial_objects
-        ]
+        # the names end up as enums in the tool schema that is sent with every GPT call, so drop duplicates
+        self.ship_names = list(
+            dict.fromkeys(
+                self._format_ship_name(vehicle)
+                for vehicle in self.vehicles
+                if vehicle["type"] == "Ship"
+            )
+        )
+        # reversed so that the first match wins, just like the linear search did
+        self.vehicles_by_name = {
+            self._format_ship_name(vehicle).lower(): vehicle
+            for vehicle in reversed(self.vehicles)
+        }
 
-        self.quantum_drives = self._fetch_data("vehiclecomponent", {"typeFilter": 8})
+        self.celestial_object_names = list(
+            dict.fromkeys(
+                celestial_object["name"] for celestial_object in self.celestial_objects
+            )
+        )
+        self.celestial_object_ids = {
+            celestial_object["name"].lower(): celestial_object["id"]
+            for celestial_object in reversed(self.celestial_objects)
+        }
+
+        # the enums only change when the data changes, so build the tool here and not on every GPT call
+        self.trading_route_tool = self._build_trading_route_tool()
+        # the tools contain the old trading route tool, so let the next GPT call rebuild them
+        self.tools = None
 
     def _fetch_data(
         self, endpoint: str, params: Optional[dict[str, any]] = None
@@ -86,15 +157,22 @@ class StarHeadWingman(OpenAiWingman):
         if self.debug:
             printr.print(f"Retrieving {url}", tags="info")
 
-        response = requests.get(
-            url, params=params, timeout=self.timeout, headers=self.headers
-        )
+        response = self._get_session().get(url, params=params, timeout=self.timeout)
         response.raise_for_status()
-        if self.debug:
-            self.print_execution_time(reset_timer=True)
 
         return response.json()
 
+    def _get_session(self) -> requests.Session:
+        """Returns the requests.Session of the current thread, creating it on first use."""
+        session = getattr(self.thread_local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.thread_local.session = session
+        return session
+
     def _format_ship_name(self, vehicle: dict[str, any]) -> str:
         """Formats name by combining model and name, avoiding repetition"""
         return (
@@ -103,45 +181,42 @@ class StarHeadWingman(OpenAiWingman):
             else vehicle["name"]
         )
 
-    async def _execute_command_by_function_call(
-        self, function_name: str, function_args: dict[str, any]
+    async def _get_best_trading_route_function(
+        self, function_args: dict[str, any]
     ) -> tuple[str, str]:
-        """Execute commands passed from the base class and handles the 'get_best_trading_route'."""
-        (
-            function_response,
-            instant_response,
-        ) = await super()._execute_command_by_function_call(
-            function_name, function_args
+        """Handles the 'get_best_trading_route' function. The blocking API requests run in a thread so that multiple calls can overlap."""
+        function_response = await asyncio.to_thread(
+            self._get_best_trading_route, **function_args
         )
-        if function_name == "get_best_trading_route":
-            function_response = self._get_best_trading_route(**function_args)
-        return function_response, instant_response
+        return function_response, ""
 
     def _build_tools(self) -> list[dict[str, any]]:
         """Builds the toolset for execution, adding custom function 'get_best_trading_route'."""
         tools = super()._build_tools()
-        tools.append(
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_best_trading_route",
-                    "description": "Finds the best trade route for a given spaceship and position.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "ship": {"type": "string", "enum": self.ship_names},
-                            "position": {
-                                "type": "string",
-                                "enum": self.celestial_object_names,
-                            },
-                            "moneyToSpend": {"type": "number"},
+        tools.append(self.trading_route_tool)
+        return tools
+
+    def _build_trading_route_tool(self) -> dict[str, any]:
+        """Builds the tool descriptor for the custom function 'get_best_trading_route' from the loaded StarHead data."""
+        return {
+            "type": "function",
+            "function": {
+                "name": "get_best_trading_route",
+                "description": "Finds the best trade route for a given spaceship and position.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "ship": {"type": "string", "enum": self.ship_names},
+                        "position": {
+                            "type": "string",
+                            "enum": self.celestial_object_names,
                         },
-                        "required": ["ship", "position", "moneyToSpend"],
+                        "moneyToSpend": {"type": "number"},
                     },
+                    "required": ["ship", "position", "moneyToSpend"],
                 },
-            }
-        )
-        return tools
+            },
+        }
 
     def _get_best_trading_route(
         self, ship: str, position: str, moneyToSpend: float
@@ -150,14 +225,21 @@ class StarHeadWingman(OpenAiWingman):
         Note that the function arguments have to match the funtion_args from OpenAI, hence the camelCase!
         """
 
-        cargo, qd = self._get_ship_details(ship)
-        if not cargo or not qd:
-            return f"Could not find ship '{ship}' in the StarHead database."
+        cache_key = (ship.lower(), position.lower(), moneyToSpend)
+        with self.cache_lock:
+            cached_route = self.route_cache.get(cache_key)
+        if cached_route and time.monotonic() - cached_route[0] < self.route_cache_ttl:
+            return cached_route[1]
 
+        # resolve the position first: it's a local lookup while the ship details need an API call
         celestial_object_id = self._get_celestial_object_id(position)
         if not celestial_object_id:
             return f"Could not find celestial object '{position}' in the StarHead database."
 
+        cargo, qd = self._get_ship_details(ship)
+        if not cargo or not qd:
+            return f"Could not find ship '{ship}' in the StarHead database."
+
         data = {
             "startCelestialObjectId": celestial_object_id,
             "quantumDriveId": qd["id"] if qd else None,
@@ -167,43 +249,32 @@ class StarHeadWingman(OpenAiWingman):
             "onlySingleSections": True,
         }
         url = f"{self.star_head_url}/trading"
-        response = requests.post(
+        response = self._get_session().post(
             url=url,
             json=data,
             timeout=self.timeout,
-            headers=self.headers,
         )
         response.raise_for_status()
 
         parsed_response = response.json()
         if parsed_response:
             section = parsed_response[0]
-            return json.dumps(section)
+            # compact separators: this ends up in the conversation history and is sent with every GPT call
+            route = json.dumps(section, separators=(",", ":"))
+            with self.cache_lock:
+                self.route_cache[cache_key] = (time.monotonic(), route)
+            return route
         return "No route found. This might be an issue with the StarHead API."
 
     def _get_celestial_object_id(self, name: str) -> Optional[int]:
         """Finds the ID of the celestial object with the specified name."""
-        return next(
-            (
-                obj["id"]
-                for obj in self.celestial_objects
-                if obj["name"].lower() == name.lower()
-            ),
-            None,
-        )
+        return self.celestial_object_ids.get(name.lower())
 
     def _get_ship_details(
         self, ship_name: str
     ) -> tuple[Optional[int], Optional[dict[str, any]]]:
         """Gets ship details including cargo capacity and quantum drive information."""
-        vehicle = next(
-            (
-                v
-                for v in self.vehicles
-                if self._format_ship_name(v).lower() == ship_name.lower()
-            ),
-            None,
-        )
+        vehicle = self.vehicles_by_name.get(ship_name.lower())
         if vehicle:
             cargo = vehicle.get("scuCargo")
             loadouts = self._get_ship_loadout(vehicle.get("id"))
@@ -225,9 +296,17 @@ class StarHeadWingman(OpenAiWingman):
 
     def _get_ship_loadout(self, ship_id: Optional[int]) -> Optional[dict[str, any]]:
         """Retrieves loadout data for a given ship ID."""
+        with self.cache_lock:
+            cached_loadout = self.ship_loadouts.get(ship_id)
+        if cached_loadout:
+            return cached_loadout
+
         if ship_id:
             try:
                 loadout = self._fetch_data(f"vehicle/{ship_id}/loadout")
+                if loadout:
+                    with self.cache_lock:
+                        self.ship_loadouts[ship_id] = loadout
                 return loadout or None
             except requests.HTTPError:
                 printr.print(
@@ -20,6 +20,27 @@ except AttributeError:
     # )
     import pyautogui as key_module
 
+# the key names key_module understands. Both libs silently ignore any other key, so we check the config against these on load
+KNOWN_KEYS = frozenset(
+    getattr(key_module, "KEYBOARD_MAPPING", None)
+    or getattr(key_module, "KEYBOARD_KEYS", None)
+    or ()
+)
+
+
+def is_known_key(key_name: Any) -> bool:
+    """Checks if key_module will actually press the given key, following its own rules for key names.
+
+    pydirectinput is case-sensitive, while pyautogui lowercases all names longer than one character (so "F1" and "Alt" work there).
+    """
+    if (
+        key_module.__name__ == "pyautogui"
+        and isinstance(key_name, str)
+        and len(key_name) > 1
+    ):
+        key_name = key_name.lower()
+    return key_name in KNOWN_KEYS
+
 
 class Wingman(FileCreator):
     """The "highest" Wingman base class in the chain. It does some very basic things but is meant to be 'virtual', and so are most its methods, so you'll probably never instantiate it directly.
@@ -68,6 +89,45 @@ class Wingman(FileCreator):
         self.app_root_dir = app_root_dir
         """The path to the root directory of the app. This is where the Wingman executable lives."""
 
+        # reversed so that the first command with a given name wins
+        self.commands_by_name: dict[str, dict] = {
+            command["name"]: command
+            for command in reversed(self.config.get("commands", []))
+        }
+        """All configured commands by their name. Built once so that looking up a command doesn't scan the whole config."""
+
+        self.keypresses_by_name: dict[
+            str, tuple[tuple[str, str | None, float | None, float | None], ...]
+        ] = {
+            name: self._compile_keypresses(command)
+            for name, command in self.commands_by_name.items()
+        }
+        """Command name -> its keys as (key, modifier, hold, wait) tuples. Compiled once so that executing a command doesn't have to read its config entries again."""
+
+        self.instant_activation_phrases: list[
+            tuple[str, int, SequenceMatcher, dict]
+        ] = []
+        """All (lowercased) instant_activation phrases with their length, a matcher and their command, in config order. Built once so that matching a transcript doesn't scan the whole config."""
+
+        self.instant_activation_commands_by_phrase: dict[str, dict] = {}
+        """Lowercased instant_activation phrase -> command. Used to skip fuzzy matching if the user said a phrase exactly."""
+
+        for command in self.config.get("commands", []):
+            for phrase in command.get("instant_activation") or []:
+                phrase_lower = phrase.lower()
+                # the matcher caches its lookup tables for the phrase (seq2), so only the transcript has to be set per comparison
+                self.instant_activation_phrases.append(
+                    (
+                        phrase_lower,
+                        len(phrase_lower),
+                        SequenceMatcher(None, "", phrase_lower),
+                        command,
+                    )
+                )
+                self.instant_activation_commands_by_phrase.setdefault(
+                    phrase_lower, command
+                )
+
     @staticmethod
     def create_dynamically(
         module_path: str,
@@ -128,7 +188,25 @@ class Wingman(FileCreator):
         Returns:
             list[str]: A list of error messages or an empty list if everything is okay.
         """
-        return []
+        errors: list[str] = []
+
+        # without a known key list we can't tell, so leave it to key_module
+        if not KNOWN_KEYS:
+            return errors
+
+        for command in self.config.get("commands", []):
+            for key, modifier, _hold, _wait in self._compile_keypresses(command):
+                for key_name in (key, modifier):
+                    if key_name is not None and not is_known_key(key_name):
+                        errors.append(
+                            f"Unknown key '{key_name}' in command '{command.get('name')}'"
+                        )
+                if key is None:
+                    errors.append(
+                        f"Missing 'key' in one of the keys of command '{command.get('name')}'"
+                    )
+
+        return errors
 
     # TODO: this should be async
     def prepare(self):
@@ -250,15 +328,7 @@ class Wingman(FileCreator):
             {}: The command object from the config
         """
 
-        command = next(
-            (
-                item
-                for item in self.config.get("commands", [])
-                if item["name"] == command_name
-            ),
-            None,
-        )
-        return command
+        return self.commands_by_name.get(command_name)
 
     def _select_command_response(self, command: dict) -> str | None:
         """Returns one of the configured responses of the command. This base implementation returns a random one.
@@ -269,8 +339,8 @@ class Wingman(FileCreator):
         Returns:
             str: A random response from the command's responses list in the config.
         """
-        command_responses = command.get("responses", None)
-        if (command_responses is None) or (len(command_responses) == 0):
+        command_responses = command.get("responses")
+        if not command_responses:
             return None
 
         return random.choice(command_responses)
@@ -285,28 +355,51 @@ class Wingman(FileCreator):
             {} | None: The executed instant_activation command.
         """
 
-        instant_activation_commands = [
-            command
-            for command in self.config.get("commands", [])
-            if command.get("instant_activation")
-        ]
-
-        # check if transcript matches any instant activation command. Each command has a list of possible phrases
-        for command in instant_activation_commands:
-            for phrase in command.get("instant_activation"):
-                ratio = SequenceMatcher(
-                    None,
-                    transcript.lower(),
-                    phrase.lower(),
-                ).ratio()
-                if (
-                    ratio > 0.8
-                ):  # if the ratio is higher than 0.8, we assume that the command was spoken
-                    self._execute_command(command)
-
-                    if command.get("responses"):
-                        return command
-                    return None
+        transcript_lower = transcript.lower()
+
+        # fast path: the user said one of the phrases exactly
+        command = self.instant_activation_commands_by_phrase.get(transcript_lower)
+        if command:
+            return self._execute_matched_instant_activation_command(command)
+
+        transcript_length = len(transcript_lower)
+
+        # check if transcript matches any instant activation phrase. Each command can have multiple phrases
+        for (
+            _phrase_lower,
+            phrase_length,
+            matcher,
+            command,
+        ) in self.instant_activation_phrases:
+            # the ratio can never exceed 2 * min(len) / total length, so skip phrases whose length alone rules them out
+            total_length = transcript_length + phrase_length
+            if (
+                total_length
+                and 2 * min(transcript_length, phrase_length) / total_length <= 0.8
+            ):
+                continue
+
+            matcher.set_seq1(transcript_lower)
+            # quick_ratio() is a cheap upper bound of ratio(), so only run the full matching if it can still pass
+            if (
+                matcher.quick_ratio() > 0.8 and matcher.ratio() > 0.8
+            ):  # if the ratio is higher than 0.8, we assume that the command was spoken
+                return self._execute_matched_instant_activation_command(command)
+        return None
+
+    def _execute_matched_instant_activation_command(self, command: dict) -> dict | None:
+        """Executes an instant_activation command that matched the transcript.
+
+        Args:
+            command (dict): The matched command object from the config
+
+        Returns:
+            {} | None: The executed command if it has responses, None otherwise.
+        """
+        self._execute_command(command)
+
+        if command.get("responses"):
+            return command
         return None
 
     def _execute_command(self, command: dict) -> str:
@@ -322,19 +415,20 @@ class Wingman(FileCreator):
         if not command:
             return "Command not found"
 
-        printr.print(f"❖ Executing command: {command.get('name')}", tags="info")
+        name = command.get("name")
+        printr.print(f"❖ Executing command: {name}", tags="info")
 
         if self.debug:
             printr.print(
                 "Skipping actual keypress execution in debug_mode...", tags="warn"
             )
 
-        if len(command.get("keys", [])) > 0 and not self.debug:
+        if command.get("keys") and not self.debug:
             self.execute_keypress(command)
         # TODO: we could do mouse_events here, too...
 
         # handle the global special commands:
-        if command.get("name", None) == "ResetConversationHistory":
+        if name == "ResetConversationHistory":
             self.reset_conversation_history()
 
         if not self.debug:
@@ -354,19 +448,48 @@ class Wingman(FileCreator):
             command (dict): The command object from the config to execute
         """
 
-        for entry in command.get("keys", []):
-            if entry.get("modifier"):
-                key_module.keyDown(entry["modifier"])
-
-            if entry.get("hold"):
-                key_module.keyDown(entry["key"])
-                time.sleep(entry["hold"])
-                key_module.keyUp(entry["key"])
+        name = command.get("name")
+        # names can be duplicated in the config, so only use the compiled keys if they belong to this very command
+        if self.commands_by_name.get(name) is command:
+            keypresses = self.keypresses_by_name[name]
+        else:
+            keypresses = self._compile_keypresses(command)
+
+        for key, modifier, hold, wait in keypresses:
+            if modifier:
+                key_module.keyDown(modifier)
+
+            if hold:
+                key_module.keyDown(key)
+                time.sleep(hold)
+                key_module.keyUp(key)
             else:
-                key_module.press(entry["key"])
+                key_module.press(key)
+
+            if modifier:
+                key_module.keyUp(modifier)
+
+            if wait:
+                time.sleep(wait)
+
+    @staticmethod
+    def _compile_keypresses(
+        command: dict,
+    ) -> tuple[tuple[str, str | None, float | None, float | None], ...]:
+        """Reads the keys defined in the command into (key, modifier, hold, wait) tuples.
 
-            if entry.get("modifier"):
-                key_module.keyUp(entry["modifier"])
+        Args:
+            command (dict): The command object from the config
 
-            if entry.get("wait"):
-                time.sleep(entry["wait"])
+        Returns:
+            A tuple with one (key, modifier, hold, wait) tuple per configured key.
+        """
+        return tuple(
+            (
+                entry.get("key"),
+                entry.get("modifier"),
+                entry.get("hold"),
+                entry.get("wait"),
+            )
+            for entry in command.get("keys") or []
+        )